@@ -0,0 +1,1297 @@
+# Moteur d'anonymisation, utilisable hors de l'interface Streamlit
+import os
+import re
+import sys
+import datetime
+import codecs
+import functools
+import tempfile
+import multiprocessing
+import time
+from array import array
+from collections import namedtuple
+import PyPDF2
+import docx
+from io import BytesIO
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.lib.enums import TA_LEFT
+
+try:
+    import resource
+except ImportError:  # Windows : pic mémoire non disponible
+    resource = None
+
+# Types MIME acceptés
+MIME_PDF = "application/pdf"
+MIME_DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+MIME_TXT = "text/plain"
+MIME_BY_EXTENSION = {
+    ".pdf": MIME_PDF,
+    ".docx": MIME_DOCX,
+    ".txt": MIME_TXT,
+}
+
+# Étapes signalées au callback de progression : progress(étape, courant, total)
+STAGE_EXTRACTION = "extraction"
+STAGE_ANONYMISATION = "anonymisation"
+STAGE_RENDU = "rendu"
+# Nettoyage du texte pour le PDF, chronométré à part dans le rapport de traitement
+TIMING_NORMALISATION = "normalisation"
+
+# Taille maximale d'un document, configurable par ANONYMISEUR_MAX_UPLOAD_MB
+MAX_UPLOAD_BYTES = int(os.environ.get("ANONYMISEUR_MAX_UPLOAD_MB", "50")) * 1024 * 1024
+# Au-delà de cette taille, les copies de fichiers sont écrites sur disque
+SPOOL_MAX_MEMORY = 1024 * 1024
+# Taille des blocs lus lors des copies et du décodage
+READ_BLOCK_SIZE = 64 * 1024
+# Limites souples : au-delà, le rapport de traitement signale le document et,
+# pour la taille, le PDF est écrit directement sur disque plutôt qu'en mémoire
+SOFT_LIMIT_BYTES = int(os.environ.get("ANONYMISEUR_SOFT_LIMIT_MB", "10")) * 1024 * 1024
+SOFT_LIMIT_SECONDS = float(os.environ.get("ANONYMISEUR_SOFT_LIMIT_SECONDS", "30"))
+
+class DocumentTooLarge(ValueError):
+    """
+    Levée lorsqu'un document dépasse la taille maximale autorisée
+    """
+
+def _size_error(size, max_bytes):
+    return DocumentTooLarge(
+        f"Document trop volumineux : {size / (1024 * 1024):.1f} Mo "
+        f"(maximum {max_bytes / (1024 * 1024):.1f} Mo)"
+    )
+
+# Fonction pour vérifier la taille d'un fichier avant de le lire
+def check_size(uploaded_file, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Retourne la taille du fichier en octets sans le lire
+    Lève DocumentTooLarge si elle dépasse max_bytes (None ou 0 : pas de limite)
+    """
+    size = getattr(uploaded_file, 'size', None)
+    if size is None:
+        position = uploaded_file.tell()
+        size = uploaded_file.seek(0, os.SEEK_END)
+        uploaded_file.seek(position)
+    size -= uploaded_file.tell()
+    if max_bytes and size > max_bytes:
+        raise _size_error(size, max_bytes)
+    return size
+
+# Fonction pour copier un fichier dans un fichier temporaire
+def spool_upload(uploaded_file, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Copie le fichier par blocs dans un fichier temporaire, gardé en mémoire
+    jusqu'à SPOOL_MAX_MEMORY octets puis écrit sur disque
+    Lève DocumentTooLarge dès que max_bytes est dépassé
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    copied = 0
+    while True:
+        block = uploaded_file.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        copied += len(block)
+        if max_bytes and copied > max_bytes:
+            spooled.close()
+            raise _size_error(copied, max_bytes)
+        spooled.write(block)
+    spooled.seek(0)
+    return spooled
+
+# Fonction pour décoder un fichier texte UTF-8 par blocs
+def decode_text(text_file, encoding='utf-8'):
+    """
+    Décode le fichier bloc par bloc, sans charger tous les octets en mémoire
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    parts = []
+    while True:
+        block = text_file.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        parts.append(decoder.decode(block))
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts)
+
+# Texte structuré en pages et en lignes
+# Les lignes sont séparées par '\n' et les pages par PAGE_SEPARATOR (un saut de page
+# seul sur sa ligne), de sorte que ^ et $ (re.MULTILINE) ne voient jamais la dernière
+# ligne d'une page collée à la première de la suivante
+# Seule la séquence complète PAGE_SEPARATOR sépare deux pages, lue de gauche à droite
+# comme str.split : un saut de page en début ou en fin de texte, ou juste après un
+# séparateur, reste dans le texte de la page, si bien que joindre les pages par
+# PAGE_SEPARATOR redonne toujours le texte d'origine
+# line_starts : position (en caractères) du début de chaque ligne, séparateurs exclus
+# page_starts : position du début de chaque page
+# Les positions sont stockées dans des array('L') : 4 ou 8 octets par ligne
+PAGE_BREAK = "\f"
+PAGE_SEPARATOR = "\n" + PAGE_BREAK + "\n"
+TextLayout = namedtuple('TextLayout', ['text', 'line_starts', 'page_starts'])
+
+# Fonction pour retrouver la structure en pages et en lignes d'un texte
+def text_layout(text):
+    """
+    Retourne le TextLayout d'un texte dont les pages sont séparées par PAGE_SEPARATOR
+    """
+    line_starts = array('L')
+    page_starts = array('L')
+    length = len(text)
+    page_start = 0
+    while True:
+        page_end = text.find(PAGE_SEPARATOR, page_start)
+        if page_end == -1:
+            page_end = length
+        page_starts.append(page_start)
+        start = page_start
+        while True:
+            line_starts.append(start)
+            end = text.find('\n', start, page_end)
+            if end == -1:
+                break
+            start = end + 1
+        if page_end == length:
+            break
+        page_start = page_end + len(PAGE_SEPARATOR)
+    return TextLayout(text, line_starts, page_starts)
+
+def iter_pages(layout):
+    """
+    Itère sur le texte de chaque page, sans les séparateurs
+    """
+    text, page_starts = layout.text, layout.page_starts
+    for i, start in enumerate(page_starts):
+        if i + 1 < len(page_starts):
+            yield text[start:page_starts[i + 1] - len(PAGE_SEPARATOR)]
+        else:
+            yield text[start:]
+
+def iter_lines(layout):
+    """
+    Itère sur les lignes sous la forme (numéro de page, numéro de ligne dans la page, ligne),
+    numérotées à partir de 1
+    """
+    text, line_starts, page_starts = layout.text, layout.line_starts, layout.page_starts
+    page = 0
+    line_number = 0
+    for start in line_starts:
+        while page < len(page_starts) and page_starts[page] <= start:
+            page += 1
+            line_number = 0
+        line_number += 1
+        end = text.find('\n', start)
+        yield page, line_number, text[start:end if end != -1 else len(text)]
+
+# Fonction pour extraire le texte d'un PDF avec sa structure en pages et en lignes
+def extract_layout_from_pdf(pdf_file, progress=None):
+    pdf_reader = PyPDF2.PdfReader(pdf_file)
+    pages = []
+    line_starts = array('L')
+    page_starts = array('L')
+    offset = 0
+    total = len(pdf_reader.pages)
+    for i, page in enumerate(pdf_reader.pages, start=1):
+        # Fins de ligne normalisées ; un saut de page dans le texte extrait
+        # serait confondu avec un séparateur de pages
+        page_text = page.extract_text() or ""
+        page_text = page_text.replace('\r\n', '\n').replace('\r', '\n').replace(PAGE_BREAK, '\n')
+        page_text = page_text.rstrip('\n')
+        if pages:
+            offset += len(PAGE_SEPARATOR)
+        page_starts.append(offset)
+        for line in page_text.split('\n'):
+            line_starts.append(offset)
+            offset += len(line) + 1
+        offset -= 1
+        pages.append(page_text)
+        if progress:
+            progress(STAGE_EXTRACTION, i, total)
+    if not pages:
+        return text_layout("")
+    return TextLayout(PAGE_SEPARATOR.join(pages), line_starts, page_starts)
+
+# Fonction pour extraire le texte d'un PDF
+def extract_text_from_pdf(pdf_file, progress=None):
+    return extract_layout_from_pdf(pdf_file, progress).text
+
+# Fonction pour extraire le texte d'un DOCX
+def extract_text_from_docx(docx_file, progress=None):
+    doc = docx.Document(docx_file)
+    text = ""
+    for paragraph in doc.paragraphs:
+        text += paragraph.text + "\n"
+    if progress:
+        progress(STAGE_EXTRACTION, 1, 1)
+    return text
+
+# Fonction pour extraire le texte structuré selon le type de fichier
+def extract_layout(uploaded_file, file_type, progress=None, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Extrait le texte d'un fichier PDF, DOCX ou TXT selon son type MIME, avec sa
+    structure en pages et en lignes (TextLayout)
+    Le fichier est lu en flux (il doit permettre seek) après vérification de sa taille
+    """
+    check_size(uploaded_file, max_bytes)
+    
+    if file_type == MIME_PDF:
+        return extract_layout_from_pdf(uploaded_file, progress)
+    if file_type == MIME_DOCX:
+        return text_layout(extract_text_from_docx(uploaded_file, progress))
+    if file_type == MIME_TXT:
+        text = decode_text(uploaded_file)
+        if progress:
+            progress(STAGE_EXTRACTION, 1, 1)
+        return text_layout(text)
+    raise ValueError(f"Format non supporté : {file_type}")
+
+# Fonction pour extraire le texte selon le type de fichier
+def extract_text(uploaded_file, file_type, progress=None, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Extrait le texte d'un fichier PDF, DOCX ou TXT selon son type MIME
+    (voir extract_layout)
+    """
+    return extract_layout(uploaded_file, file_type, progress, max_bytes).text
+
+try:
+    from re import _parser as _sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse as _sre_parse
+
+# Règle d'anonymisation : motif compilé, remplacement, ancre et longueur maximale
+# L'ancre est une expression très simple (littéraux ou classe de caractères) présente
+# dans toute correspondance du motif : si elle est absente du texte, la règle est ignorée
+# La longueur maximale d'une correspondance vaut None si le motif n'est pas borné
+# Pour un motif borné, cluster regroupe en une seule correspondance les occurrences
+# de l'ancre distantes de moins de width caractères
+# barrier reconnaît un caractère qu'aucune partie du motif ne peut lire : une
+# recherche ne le dépasse jamais (None si le motif peut lire n'importe quel caractère)
+# behind est le nombre de caractères lus avant la position de départ (\b, ^,
+# assertions arrière)
+Rule = namedtuple('Rule', ['pattern', 'replacement', 'anchor', 'width', 'cluster', 'barrier', 'behind'])
+
+def _max_width(pattern):
+    try:
+        width = _sre_parse.parse(pattern.pattern, pattern.flags).getwidth()[1]
+    except Exception:
+        return None
+    return None if width >= _sre_parse.MAXREPEAT - 1 else width
+
+# Classes équivalentes aux catégories de sre_parse
+_CATEGORY_CLASSES = {
+    _sre_parse.CATEGORY_DIGIT: r'\d',
+    _sre_parse.CATEGORY_NOT_DIGIT: r'\D',
+    _sre_parse.CATEGORY_SPACE: r'\s',
+    _sre_parse.CATEGORY_NOT_SPACE: r'\S',
+    _sre_parse.CATEGORY_WORD: r'\w',
+    _sre_parse.CATEGORY_NOT_WORD: r'\W',
+}
+
+def _read_classes(items, parts):
+    """
+    Ajoute à parts les classes de caractères que les éléments peuvent lire et
+    retourne le nombre de caractères lus avant la position courante, ou None si
+    un élément peut lire n'importe quel caractère
+    """
+    behind = 1
+    for op, av in items:
+        if op == _sre_parse.LITERAL:
+            parts.append(re.escape(chr(av)))
+        elif op == _sre_parse.IN:
+            for item_op, item_av in av:
+                if item_op == _sre_parse.LITERAL:
+                    parts.append(re.escape(chr(item_av)))
+                elif item_op == _sre_parse.RANGE:
+                    parts.append(f'{re.escape(chr(item_av[0]))}-{re.escape(chr(item_av[1]))}')
+                elif item_op == _sre_parse.CATEGORY and item_av in _CATEGORY_CLASSES:
+                    parts.append(_CATEGORY_CLASSES[item_av])
+                else:
+                    return None
+        elif op in (_sre_parse.AT, _sre_parse.GROUPREF):
+            # Assertion sans lecture, ou texte déjà lu par un groupe
+            continue
+        else:
+            if op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT):
+                children = [av[2]]
+            elif op == _sre_parse.SUBPATTERN:
+                children = [av[-1]]
+            elif op == _sre_parse.BRANCH:
+                children = av[1]
+            elif op in (_sre_parse.ASSERT, _sre_parse.ASSERT_NOT):
+                children = [av[1]]
+                if av[0] < 0:
+                    behind = max(behind, av[1].getwidth()[1])
+            else:
+                return None
+            for child in children:
+                child_behind = _read_classes(child, parts)
+                if child_behind is None:
+                    return None
+                behind = max(behind, child_behind)
+    return behind
+
+def _barrier(pattern):
+    """
+    Retourne (barrier, behind) pour la règle (voir Rule)
+    """
+    parts = []
+    try:
+        behind = _read_classes(_sre_parse.parse(pattern.pattern, pattern.flags), parts)
+    except Exception:
+        return None, None
+    if behind is None or not parts:
+        return None, None
+    return re.compile(f"[^{''.join(parts)}]", pattern.flags & (re.IGNORECASE | re.ASCII)), behind
+
+def _rule(regex, replacement, anchor=None, flags=0):
+    # L'ancre est compilée avec la même sensibilité à la casse que le motif
+    pattern = re.compile(regex, flags)
+    width = _max_width(pattern)
+    cluster = None
+    if anchor and width is not None:
+        cluster = re.compile(rf'(?:{anchor})(?:[\s\S]{{0,{width}}}(?:{anchor}))*', flags & re.IGNORECASE)
+    return Rule(
+        pattern,
+        replacement,
+        re.compile(anchor, flags & re.IGNORECASE) if anchor else None,
+        width,
+        cluster,
+        *_barrier(pattern)
+    )
+
+# Règles d'anonymisation automatique (patterns RGPD), appliquées dans l'ordre
+ANONYMIZATION_RULES = [
+    # Masquer les noms et prénoms courants (patterns basiques)
+    # Recherche de "Prénom NOM" en début de ligne ou après certains mots-clés
+    _rule(
+        r'\b(M\.|Mme|Mlle|Monsieur|Madame|Mademoiselle)\s+([A-Z][a-zàâäéèêëïîôùûüç]+(\s+[A-Z][a-zàâäéèêëïîôùûüç]+)?)\s+([A-Z][A-ZÀÂÄÉÈÊËÏÎÔÙÛÜÇ\-]+)\b',
+        r'\1 [PRÉNOM_MASQUÉ] [NOM_MASQUÉ]',
+        anchor=r'M\.|Mme|Mlle|Monsieur|Madame|Mademoiselle'
+    ),
+    # Masquer les noms en majuscules suivis de prénoms
+    _rule(
+        r'\b([A-Z][A-ZÀÂÄÉÈÊËÏÎÔÙÛÜÇ\-]{2,})\s+([A-Z][a-zàâäéèêëïîôùûüç]+)\b',
+        '[NOM_MASQUÉ] [PRÉNOM_MASQUÉ]'
+    ),
+    # Masquer format "Prénom Nom" en début de document ou ligne
+    _rule(
+        r'^([A-Z][a-zàâäéèêëïîôùûüç]+)\s+([A-Z][a-zàâäéèêëïîôùûüç]+)',
+        '[PRÉNOM_MASQUÉ] [NOM_MASQUÉ]',
+        flags=re.MULTILINE
+    ),
+    # Masquer les emails
+    _rule(
+        r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
+        '[EMAIL_MASQUÉ]',
+        anchor='@'
+    ),
+    # Masquer les numéros de téléphone français et internationaux
+    _rule(
+        r'(\+33|0033|0)[1-9](\s?\d{2}){4}',
+        '[TÉLÉPHONE_MASQUÉ]',
+        anchor=r'\+33|0'
+    ),
+    _rule(
+        r'\b\d{2}[\s\.\-]?\d{2}[\s\.\-]?\d{2}[\s\.\-]?\d{2}[\s\.\-]?\d{2}\b',
+        '[TÉLÉPHONE_MASQUÉ]',
+        anchor=r'\d'
+    ),
+    # Masquer les adresses complètes (pattern amélioré)
+    _rule(
+        r'\d{1,5}\s+(bis|ter)?\s*(rue|avenue|boulevard|allée|impasse|place|chemin|route|cours|quai)\s+[\w\s\'\-]+,?\s*\d{5}?\s*[\w\s\-]*',
+        '[ADRESSE_MASQUÉE]',
+        anchor=r'\d',
+        flags=re.IGNORECASE
+    ),
+    # Masquer les adresses sans numéro
+    _rule(
+        r'\b(rue|avenue|boulevard|allée|impasse|place|chemin|route|cours|quai)\s+[\w\s\'\-]{3,40}\s*,?\s*\d{5}',
+        '[ADRESSE_MASQUÉE]',
+        anchor=r'\d',
+        flags=re.IGNORECASE
+    ),
+    # Masquer les codes postaux français
+    _rule(
+        r'\b\d{5}\b',
+        '[CODE_POSTAL_MASQUÉ]',
+        anchor=r'\d'
+    ),
+    # Masquer les villes après code postal
+    _rule(
+        r'\[CODE_POSTAL_MASQUÉ\]\s+[A-ZÀÂÄÉÈÊËÏÎÔÙÛÜÇ][a-zàâäéèêëïîôùûüç\s\-]+',
+        '[CODE_POSTAL_MASQUÉ] [VILLE_MASQUÉE]',
+        anchor=r'\[CODE_POSTAL_MASQUÉ\]'
+    ),
+    # Masquer les dates de naissance
+    _rule(
+        r'\b(né|née|naissance|birth)\s*(le|date)?\s*:?\s*\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4}\b',
+        '[DATE_NAISSANCE_MASQUÉE]',
+        anchor=r'\d',
+        flags=re.IGNORECASE
+    ),
+    # Masquer les dates au format JJ/MM/AAAA
+    _rule(
+        r'\b\d{1,2}[\/\-\.]\d{1,2}[\/\-\.](19|20)\d{2}\b',
+        '[DATE_MASQUÉE]',
+        anchor='19|20'
+    ),
+    # Masquer l'âge
+    _rule(
+        r'\b\d{2}\s*ans\b',
+        '[ÂGE_MASQUÉ]',
+        anchor=r'\d',
+        flags=re.IGNORECASE
+    ),
+    # Masquer les numéros de sécurité sociale
+    _rule(
+        r'\b[1-2]\s?\d{2}\s?\d{2}\s?\d{2}\s?\d{3}\s?\d{3}\s?\d{2}\b',
+        '[NUMÉRO_SÉCU_MASQUÉ]',
+        anchor='[12]'
+    ),
+    # Masquer permis de conduire
+    _rule(
+        r'\b(permis)\s*(de conduire)?\s*:?\s*[A-Z0-9]{10,}\b',
+        '[PERMIS_MASQUÉ]',
+        anchor='permis',
+        flags=re.IGNORECASE
+    ),
+]
+
+# Fonction pour construire la liste des règles à appliquer
+def get_rules(custom_firstname="", custom_lastname=""):
+    """
+    Retourne les règles du nom et prénom fournis manuellement (prioritaires)
+    suivies des règles automatiques
+    """
+    return list(_custom_rules(custom_firstname, custom_lastname)) + ANONYMIZATION_RULES
+
+# Les règles manuelles sont mises en cache : les construire coûte plus cher que
+# d'anonymiser un texte court. Le cache contient des noms de candidats : il est
+# limité à quelques entrées et vidé par forget_custom_names
+@functools.lru_cache(maxsize=4)
+def _custom_rules(custom_firstname, custom_lastname):
+    rules = []
+    
+    if custom_firstname.strip():
+        # Masquer le prénom exact (insensible à la casse)
+        rules.append(_rule(
+            rf'\b{re.escape(custom_firstname)}\b',
+            '[PRÉNOM_MASQUÉ]',
+            anchor=re.escape(custom_firstname),
+            flags=re.IGNORECASE
+        ))
+    
+    if custom_lastname.strip():
+        # Masquer le nom exact (insensible à la casse)
+        rules.append(_rule(
+            rf'\b{re.escape(custom_lastname)}\b',
+            '[NOM_MASQUÉ]',
+            anchor=re.escape(custom_lastname),
+            flags=re.IGNORECASE
+        ))
+    
+    return tuple(rules)
+
+# Fonction pour effacer les noms fournis manuellement des caches
+def forget_custom_names():
+    """
+    Vide le cache des règles manuelles et celui du module re, qui conservent
+    les noms et prénoms des candidats
+    """
+    _custom_rules.cache_clear()
+    re.purge()
+
+# Parcours des correspondances par zones, partagé par l'anonymisation par ancres
+# et l'anonymisation parallèle
+def _scan_end(text, rule, end):
+    """
+    Retourne la position jusqu'à laquelle lire le texte pour trouver exactement
+    les correspondances qui commencent avant end : la longueur maximale d'une
+    correspondance pour une règle bornée, sinon la première barrière après end
+    """
+    if rule.width is not None:
+        return min(len(text), end + rule.width + 1)
+    if rule.barrier is not None:
+        barrier = rule.barrier.search(text, end)
+        if barrier:
+            return barrier.end()
+    return len(text)
+
+def _scan(text, rule, start, end, endpos):
+    """
+    Retourne les correspondances (début, fin, remplacement) qui commencent entre
+    start et end, en recherchant depuis start comme le ferait pattern.sub
+    endpos : fin de la lecture (voir _scan_end)
+    """
+    # Parcours rapide : toute correspondance contient l'ancre
+    if rule.anchor and not rule.anchor.search(text, start, endpos):
+        return []
+    found = []
+    for match in rule.pattern.finditer(text, start, endpos):
+        if match.start() >= end:
+            break
+        found.append((match.start(), match.end(), match.expand(rule.replacement)))
+    return found
+
+def _stitch_matches(text, rule, bounds, chunk_matches):
+    """
+    Fusionne les correspondances des zones dans l'ordre, en reprenant en série
+    une zone lorsque la dernière correspondance de la précédente déborde dessus
+    """
+    matches = []
+    cursor = 0
+    for (start, end), found in zip(bounds, chunk_matches):
+        if cursor > start:
+            # Rechercher depuis la fin du débordement jusqu'à retomber sur une
+            # correspondance déjà trouvée : la suite de la zone est alors identique
+            known = {match[0]: i for i, match in enumerate(found)}
+            rescanned = []
+            for match in _scan(text, rule, cursor, end, _scan_end(text, rule, end)):
+                if match[0] in known:
+                    rescanned.extend(found[known[match[0]]:])
+                    break
+                rescanned.append(match)
+            found = rescanned
+        matches.extend(found)
+        if found:
+            cursor = found[-1][1]
+    return matches
+
+def _apply_matches(text, matches):
+    pieces = []
+    last = 0
+    for start, end, replacement in matches:
+        pieces.append(text[last:start])
+        pieces.append(replacement)
+        last = end
+    pieces.append(text[last:])
+    return ''.join(pieces)
+
+# En dessous de cette taille de texte, ou avec plus d'une zone tous les
+# REGION_MIN_SPACING caractères en moyenne, la recherche par zones coûte plus
+# qu'elle ne fait gagner
+REGION_MIN_SIZE = 20_000
+REGION_MIN_SPACING = 2_000
+
+def _anchor_regions(text, rule):
+    """
+    Retourne les zones (début, fin) où une correspondance d'une règle bornée peut
+    commencer : au plus rule.width caractères avant une occurrence de son ancre
+    Retourne None si les zones sont trop rapprochées pour que la recherche par
+    zones soit rentable
+    """
+    regions = []
+    for cluster in rule.cluster.finditer(text):
+        if len(regions) > 8 + cluster.start() // REGION_MIN_SPACING:
+            return None
+        start = max(0, cluster.start() - rule.width)
+        if regions and start <= regions[-1][1]:
+            regions[-1][1] = cluster.end()
+        else:
+            regions.append([start, cluster.end()])
+    return regions
+
+def _apply_rule(text, rule):
+    """
+    Applique une règle au texte avec le même résultat que rule.pattern.sub
+    """
+    # Parcours rapide : ignorer la règle si son ancre est absente du texte
+    if rule.anchor and not rule.anchor.search(text):
+        return text
+    if rule.cluster is None or len(text) < REGION_MIN_SIZE:
+        return rule.pattern.sub(rule.replacement, text)
+    # Règle bornée : ne rechercher qu'autour des occurrences de l'ancre, ce qui
+    # évite les paragraphes qui en sont dépourvus (sans chiffres par exemple)
+    regions = _anchor_regions(text, rule)
+    if regions is None:
+        return rule.pattern.sub(rule.replacement, text)
+    region_matches = [_scan(text, rule, start, end, _scan_end(text, rule, end)) for start, end in regions]
+    matches = _stitch_matches(text, rule, regions, region_matches)
+    return _apply_matches(text, matches)
+
+# Fonction d'anonymisation RGPD renforcée
+def anonymize_cv(text, custom_firstname="", custom_lastname=""):
+    """
+    Anonymise les données personnelles sensibles du CV selon le RGPD
+    Permet également de masquer manuellement un nom et prénom spécifique
+    """
+    return _apply_rules(text, get_rules(custom_firstname, custom_lastname))
+
+def _apply_rules(text, rules, progress=None):
+    # progress(STAGE_ANONYMISATION, règle, total) après chaque règle : point d'annulation
+    for i, rule in enumerate(rules, start=1):
+        text = _apply_rule(text, rule)
+        if progress:
+            progress(STAGE_ANONYMISATION, i, len(rules))
+    return text
+
+# Anonymisation parallèle des très gros textes
+# Taille des segments traités en parallèle (en caractères)
+PARALLEL_CHUNK_SIZE = 1_000_000
+
+def _split_chunks(text, chunk_size):
+    """
+    Découpe le texte en segments (début, fin) d'environ chunk_size caractères,
+    coupés de préférence après une ligne vide ou un saut de page
+    """
+    bounds = []
+    start = 0
+    length = len(text)
+    while start < length:
+        target = start + chunk_size
+        if target >= length:
+            end = length
+        else:
+            window_end = target + chunk_size
+            blank_line = text.find('\n\n', target, window_end)
+            page_break = text.find('\f', target, window_end)
+            if blank_line != -1 and (page_break == -1 or blank_line < page_break):
+                end = blank_line + 2
+            elif page_break != -1:
+                end = page_break + 1
+            else:
+                line_break = text.find('\n', target, window_end)
+                end = line_break + 1 if line_break != -1 else target
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+def _process_pool(workers):
+    """
+    Crée un pool de processus lancés par un serveur dédié (forkserver) ou à neuf
+    (spawn) : un fork depuis un processus à plusieurs threads (workers de
+    JobManager, serveur Streamlit) peut bloquer le processus fils
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+    else:
+        context = multiprocessing.get_context('spawn')
+    return context.Pool(workers)
+
+def _chunk_tasks(text, rule, bounds):
+    # Chaque processus reçoit son segment, le contexte lu avant son début
+    # et la suite nécessaire pour compléter ses correspondances
+    for start, end in bounds:
+        offset = max(0, start - rule.behind) if rule.behind is not None else 0
+        endpos = _scan_end(text, rule, end)
+        yield text[offset:endpos], offset, start - offset, end - offset, rule
+
+def _scan_chunk(task):
+    # Exécuté dans un processus fils
+    fragment, offset, start, end, rule = task
+    return [
+        (match_start + offset, match_end + offset, replacement)
+        for match_start, match_end, replacement in _scan(fragment, rule, start, end, len(fragment))
+    ]
+
+# Fonction d'anonymisation parallèle des très gros textes
+def anonymize_cv_parallel(text, custom_firstname="", custom_lastname="", workers=None, chunk_size=PARALLEL_CHUNK_SIZE,
+                          progress=None):
+    """
+    Anonymise un très gros texte en répartissant chaque règle sur plusieurs processus
+    Le résultat est identique à anonymize_cv : les segments sont coupés sur des lignes
+    vides ou des sauts de page, chaque processus lit au-delà de son segment juste ce
+    qu'il faut pour compléter ses correspondances (longueur maximale ou barrière de
+    la règle), et un débordement sur le segment suivant est repris en série depuis sa fin
+    Les textes de moins de deux segments sont traités en série
+    progress(STAGE_ANONYMISATION, règle, total) est appelé après chaque règle
+    """
+    rules = get_rules(custom_firstname, custom_lastname)
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(text) < 2 * chunk_size:
+        return _apply_rules(text, rules, progress)
+    
+    anonymized = text
+    
+    with _process_pool(workers) as pool:
+        for i, rule in enumerate(rules, start=1):
+            if not rule.anchor or rule.anchor.search(anonymized):
+                bounds = _split_chunks(anonymized, chunk_size)
+                chunk_matches = pool.map(_scan_chunk, _chunk_tasks(anonymized, rule, bounds), chunksize=1)
+                matches = _stitch_matches(anonymized, rule, bounds, chunk_matches)
+                anonymized = _apply_matches(anonymized, matches)
+            if progress:
+                progress(STAGE_ANONYMISATION, i, len(rules))
+    
+    return anonymized
+
+# Fonction d'anonymisation d'un texte structuré en pages
+def anonymize_layout(layout, custom_firstname="", custom_lastname="", workers=None, chunk_size=PARALLEL_CHUNK_SIZE,
+                     progress=None):
+    """
+    Anonymise un TextLayout page par page et retourne le TextLayout du texte anonymisé
+    Une correspondance ne franchit jamais un saut de page ; un texte d'une seule page
+    donne le même résultat qu'anonymize_cv
+    Les documents d'au moins deux segments répartissent leurs pages sur plusieurs processus
+    progress(STAGE_ANONYMISATION, courant, total) est appelé après chaque page (après
+    chaque règle pour un texte d'une seule page) : une exception qu'il lève, comme
+    une annulation, interrompt l'anonymisation entre deux pages
+    """
+    if len(layout.page_starts) == 1:
+        return text_layout(anonymize_cv_parallel(
+            layout.text, custom_firstname, custom_lastname, workers, chunk_size, progress
+        ))
+    
+    rules = get_rules(custom_firstname, custom_lastname)
+    pages = list(iter_pages(layout))
+    workers = workers or os.cpu_count() or 1
+    anonymized = []
+    if workers < 2 or len(layout.text) < 2 * chunk_size:
+        for page in pages:
+            anonymized.append(_apply_rules(page, rules))
+            if progress:
+                progress(STAGE_ANONYMISATION, len(anonymized), len(pages))
+    else:
+        # Sortir du bloc pendant l'itération (annulation) arrête les processus
+        with _process_pool(min(workers, len(pages))) as pool:
+            for page in pool.imap(functools.partial(_apply_rules, rules=rules), pages):
+                anonymized.append(page)
+                if progress:
+                    progress(STAGE_ANONYMISATION, len(anonymized), len(pages))
+    return text_layout(PAGE_SEPARATOR.join(anonymized))
+
+# Anonymisation par lots de textes courts
+# Les textes sont joints par BATCH_SEPARATOR : le caractère nul n'appartient à aucune
+# classe des règles et ne peut donc pas être consommé, et le saut de ligne qui le suit
+# fait commencer chaque texte en début de ligne (^ avec re.MULTILINE), comme s'il
+# était seul. Une correspondance ne peut ni franchir un séparateur ni commencer
+# dessus sans le modifier : si un séparateur manque après l'anonymisation, le lot
+# est repris texte par texte
+BATCH_SEPARATOR = "\x00\n"
+# Taille maximale (en caractères) du texte d'un lot
+BATCH_MAX_CHARS = 1_000_000
+
+def _anonymize_group(texts, rules):
+    """
+    Anonymise un groupe de textes en un seul parcours par règle
+    """
+    if len(texts) == 1:
+        return [_apply_rules(texts[0], rules)]
+    buffer = BATCH_SEPARATOR.join(texts)
+    # Un texte contenant déjà le caractère nul rendrait le découpage ambigu
+    if buffer.count(BATCH_SEPARATOR[0]) == len(texts) - 1:
+        anonymized = _apply_rules(buffer, rules)
+        if anonymized.count(BATCH_SEPARATOR) == len(texts) - 1:
+            return anonymized.split(BATCH_SEPARATOR)
+    return [_apply_rules(text, rules) for text in texts]
+
+# Fonction d'anonymisation d'un lot de textes courts
+def anonymize_batch(texts, custom_firstname="", custom_lastname="", max_chars=BATCH_MAX_CHARS):
+    """
+    Anonymise un itérable de textes et retourne la liste des textes anonymisés,
+    dans le même ordre, chacun identique au résultat d'anonymize_cv
+    Les textes sont regroupés par lots d'environ max_chars caractères, parcourus
+    en une seule fois par chaque règle
+    Les noms fournis sont effacés des caches à la fin du lot
+    """
+    rules = get_rules(custom_firstname, custom_lastname)
+    results = []
+    group = []
+    group_chars = 0
+    try:
+        for text in texts:
+            if group and group_chars + len(text) > max_chars:
+                results.extend(_anonymize_group(group, rules))
+                group = []
+                group_chars = 0
+            group.append(text)
+            group_chars += len(text) + len(BATCH_SEPARATOR)
+        if group:
+            results.extend(_anonymize_group(group, rules))
+    finally:
+        if custom_firstname or custom_lastname:
+            forget_custom_names()
+    return results
+
+# Emojis et pictogrammes supprimés du texte du PDF
+_EMOJI_PATTERN = re.compile("["
+    u"\U0001F600-\U0001F64F"  # emoticons
+    u"\U0001F300-\U0001F5FF"  # symboles & pictogrammes
+    u"\U0001F680-\U0001F6FF"  # transport & symboles
+    u"\U0001F1E0-\U0001F1FF"  # drapeaux
+    u"\U00002500-\U00002BEF"  # symboles chinois
+    u"\U00002702-\U000027B0"
+    u"\U00002702-\U000027B0"
+    u"\U000024C2-\U0001F251"
+    u"\U0001f926-\U0001f937"
+    u"\U00010000-\U0010ffff"
+    u"\u2640-\u2642" 
+    u"\u2600-\u2B55"
+    u"\u200d"
+    u"\u23cf"
+    u"\u23e9"
+    u"\u231a"
+    u"\ufe0f"  # dingbats
+    u"\u3030"
+    "]+", flags=re.UNICODE)
+
+# Caractères accentués et typographiques normalisés pour le PDF ; les balises
+# masquées (qui peuvent contenir des emojis dans l'interface) perdent leur cadenas
+_PDF_REPLACEMENTS = str.maketrans({
+    '🔒': None,
+    'É': 'E', 'È': 'E', 'Ê': 'E', 'Ë': 'E',
+    'À': 'A', 'Â': 'A', 'Ä': 'A', 'Á': 'A',
+    'Ù': 'U', 'Û': 'U', 'Ü': 'U', 'Ú': 'U',
+    'Ô': 'O', 'Ö': 'O', 'Ó': 'O', 'Ò': 'O',
+    'Ç': 'C',
+    'Î': 'I', 'Ï': 'I', 'Í': 'I', 'Ì': 'I',
+    'é': 'e', 'è': 'e', 'ê': 'e', 'ë': 'e',
+    'à': 'a', 'â': 'a', 'ä': 'a', 'á': 'a',
+    'ù': 'u', 'û': 'u', 'ü': 'u', 'ú': 'u',
+    'ô': 'o', 'ö': 'o', 'ó': 'o', 'ò': 'o',
+    'ç': 'c',
+    'î': 'i', 'ï': 'i', 'í': 'i', 'ì': 'i',
+    '‘': "'", '’': "'", '“': '"', '”': '"',
+    '–': '-', '—': '-', '…': '...',
+    '•': '-', '●': '-', '○': '-',
+    '€': 'EUR', '£': 'GBP', '$': 'USD',
+})
+
+# Fonction pour nettoyer le texte de tous les caractères non-ASCII
+def clean_text_for_pdf(text):
+    """
+    Nettoie le texte de tous les emojis et caractères spéciaux pour le PDF
+    """
+    # Supprimer tous les emojis
+    text_cleaned = _EMOJI_PATTERN.sub(r'', text)
+    
+    # Normaliser les caractères accentués
+    text_cleaned = text_cleaned.translate(_PDF_REPLACEMENTS)
+    
+    # Forcer l'encodage ASCII - supprimer tout ce qui ne passe pas
+    text_cleaned = text_cleaned.encode('ascii', 'ignore').decode('ascii')
+    
+    return text_cleaned
+
+# Fonction pour créer un PDF du CV anonymisé
+# Nombre d'éléments (lignes) du PDF rendus entre deux appels du callback de progression
+RENDER_PROGRESS_STEP = 200
+
+def create_pdf(text, filename, timings=None, output=None, progress=None):
+    """
+    Crée un PDF à partir du texte anonymisé (chaîne ou TextLayout)
+    Chaque page du texte commence une nouvelle page du PDF
+    Si timings est un dictionnaire, y ajoute les durées du nettoyage du texte
+    (TIMING_NORMALISATION) et du rendu (STAGE_RENDU) en secondes
+    Si output est un fichier ouvert en écriture binaire, le PDF y est écrit et
+    la fonction retourne None ; sinon elle retourne les octets du PDF
+    progress(STAGE_RENDU, courant, total) est appelé tous les RENDER_PROGRESS_STEP
+    éléments rendus ; une exception qu'il lève (annulation) interrompt le rendu
+    """
+    started = time.perf_counter()
+    cleaning = 0.0
+    buffer = output if output is not None else BytesIO()
+    
+    layout = text if isinstance(text, TextLayout) else text_layout(text)
+    
+    # Créer le document PDF
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm
+    )
+    
+    # Styles
+    styles = getSampleStyleSheet()
+    style_normal = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=10,
+        leading=14,
+        alignment=TA_LEFT,
+        spaceAfter=6,
+    )
+    
+    # Contenu
+    story = []
+    
+    # Ajouter un titre simple
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=14,
+        spaceAfter=12,
+        alignment=TA_LEFT
+    )
+    story.append(Paragraph("CV ANONYMISE - CONFORME RGPD", title_style))
+    story.append(Spacer(1, 0.5*cm))
+    
+    # Ajouter le contenu du CV ligne par ligne, nettoyée AVANT tout traitement
+    current_page = 1
+    for page, _, line in iter_lines(layout):
+        if page != current_page:
+            story.append(PageBreak())
+            current_page = page
+        cleaning_started = time.perf_counter()
+        line = clean_text_for_pdf(line)
+        cleaning += time.perf_counter() - cleaning_started
+        if line.strip():
+            # Échapper uniquement les caractères XML/HTML
+            line_escaped = line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            story.append(Paragraph(line_escaped, style_normal))
+        else:
+            story.append(Spacer(1, 0.2*cm))
+    
+    # Suivre le rendu élément par élément (doc.build consomme la liste story)
+    total = len(story)
+    rendered = 0
+    interruption = []
+    def after_flowable(flowable):
+        nonlocal rendered
+        rendered += 1
+        if progress and rendered % RENDER_PROGRESS_STEP == 0:
+            try:
+                progress(STAGE_RENDU, rendered, total)
+            except BaseException as e:
+                interruption.append(e)
+                raise
+    doc.afterFlowable = after_flowable
+    
+    # Générer le PDF
+    try:
+        doc.build(story)
+    except Exception as e:
+        if interruption:
+            # Interruption demandée par le callback (annulation) : pas de PDF de repli
+            raise
+        # En cas d'erreur, créer un PDF minimal
+        buffer.seek(0)
+        buffer.truncate()
+        story = [Paragraph("ERREUR: Le CV contient des caracteres non supportes.", style_normal)]
+        doc.build(story)
+    
+    if timings is not None:
+        timings[TIMING_NORMALISATION] = cleaning
+        timings[STAGE_RENDU] = time.perf_counter() - started - cleaning
+    
+    if output is not None:
+        return None
+    
+    # Récupérer le contenu du buffer
+    pdf_data = buffer.getvalue()
+    buffer.close()
+    
+    return pdf_data
+
+# Fonction pour créer un export structuré JSON
+def create_structured_export(anonymized_text, processing_date='N/A'):
+    """
+    Crée un export JSON structuré pour analyse par une autre application
+    """
+    # Extraction des sections principales
+    sections = {
+        "text_complet": anonymized_text,
+        "metadata": {
+            "anonymise": True,
+            "conformite_rgpd": True,
+            "date_traitement": processing_date
+        },
+        "sections_detectees": {}
+    }
+    
+    # Détecter les sections courantes d'un CV
+    section_patterns = {
+        "experience": r'(EXPÉRIENCE|EXPERIENCE|PARCOURS PROFESSIONNEL)',
+        "formation": r'(FORMATION|DIPLÔMES|EDUCATION)',
+        "competences": r'(COMPÉTENCES|COMPETENCES|SKILLS)',
+        "langues": r'(LANGUES|LANGUAGES)',
+        "certifications": r'(CERTIFICATIONS|CERTIFICATS)',
+        "projets": r'(PROJETS|PROJECTS)',
+        "loisirs": r'(LOISIRS|CENTRES D\'INTÉRÊT|HOBBIES)'
+    }
+    
+    for section_name, pattern in section_patterns.items():
+        if re.search(pattern, anonymized_text, re.IGNORECASE):
+            sections["sections_detectees"][section_name] = True
+    
+    return sections
+
+# Fonction pour compter les éléments masqués
+def compute_stats(anonymized_text):
+    """
+    Compte les noms/prénoms, emails, téléphones et adresses masqués
+    """
+    return {
+        "noms": anonymized_text.count('[NOM_MASQUÉ]') + anonymized_text.count('[PRÉNOM_MASQUÉ]'),
+        "emails": anonymized_text.count('[EMAIL_MASQUÉ]'),
+        "telephones": anonymized_text.count('[TÉLÉPHONE_MASQUÉ]'),
+        "adresses": anonymized_text.count('[ADRESSE_MASQUÉE]'),
+    }
+
+# Fonction pour mesurer la mémoire résidente actuelle du processus
+def current_memory():
+    """
+    Retourne la mémoire résidente actuelle du processus en octets (None si indisponible)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+# Fonction pour mesurer le pic mémoire du processus depuis son démarrage
+def process_peak_memory():
+    """
+    Retourne le pic de mémoire résidente du processus depuis son démarrage, en
+    octets (None si indisponible). Ce pic ne redescend jamais : il couvre tous les
+    documents traités par le processus, y compris les traitements simultanés
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets ailleurs
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class ProcessingReport:
+    """
+    Rapport de performances du traitement d'un document : durée de chaque étape
+    (extraction, anonymisation, normalisation, rendu) en secondes, nombre de pages,
+    taille du fichier, mémoire et alertes des limites souples
+
+    Mémoire (octets, None si indisponible), mesurée dans le processus principal
+    (les processus de l'anonymisation parallèle ne sont pas comptés) :
+    - memory_start, memory_end : mémoire résidente au début et à la fin du document
+    - process_peak_memory : pic du processus depuis son démarrage, après le document
+    - peak_reached : True si ce pic a été atteint pendant le document ; document_peak
+      vaut alors ce pic, sinon le pic du document est inconnu (None)
+    """
+
+    __slots__ = ("timings", "pages", "characters", "size", "memory_start", "memory_end",
+                 "process_peak_memory", "peak_reached", "warnings", "pdf_spilled")
+
+    def __init__(self, size=None):
+        self.timings = {}
+        self.pages = 0
+        self.characters = 0
+        self.size = size
+        self.memory_start = None
+        self.memory_end = None
+        self.process_peak_memory = None
+        self.peak_reached = False
+        self.warnings = []
+        self.pdf_spilled = False
+
+    @property
+    def total(self):
+        return sum(self.timings.values())
+
+    @property
+    def document_peak(self):
+        return self.process_peak_memory if self.peak_reached else None
+
+    def slowest_stage(self):
+        return max(self.timings, key=self.timings.get) if self.timings else None
+
+    def as_dict(self):
+        """
+        Retourne le rapport sous forme de dictionnaire (sérialisable en JSON)
+        """
+        return {
+            "timings": dict(self.timings),
+            "total": self.total,
+            "pages": self.pages,
+            "characters": self.characters,
+            "size": self.size,
+            "memory_start": self.memory_start,
+            "memory_end": self.memory_end,
+            "process_peak_memory": self.process_peak_memory,
+            "document_peak": self.document_peak,
+            "warnings": list(self.warnings),
+            "pdf_spilled": self.pdf_spilled,
+        }
+
+class DocumentResult:
+    """
+    Résultat compact du traitement d'un document, pour les traitements par lots
+
+    Empreinte mémoire par document (CPython 64 bits) :
+    - l'objet lui-même (__slots__, sans __dict__) : environ 80 octets
+    - le texte anonymisé : 1 octet par caractère pour du texte latin-1 (français
+      accentué compris), 2 à 4 octets si le texte contient d'autres caractères
+    - le texte original : même coût, None si keep_text=False dans process_document
+    - le PDF : sa taille en octets, 0 une fois écrit sur disque par spill_pdf()
+    - les statistiques : environ 300 octets
+    - le rapport de performances (report) : environ 1 Ko
+    L'export JSON n'est pas conservé : structured() le reconstruit à la demande
+    en partageant la chaîne du texte anonymisé
+    memory_footprint() retourne l'estimation correspondante
+    """
+
+    __slots__ = ("text", "anonymized", "stats", "processing_date", "report", "_pdf", "_pdf_path")
+
+    def __init__(self, anonymized, pdf_data, text=None, processing_date='N/A', report=None, pdf_path=None):
+        self.text = text
+        self.anonymized = anonymized
+        self.stats = compute_stats(anonymized)
+        self.processing_date = processing_date
+        self.report = report
+        self._pdf = pdf_data
+        self._pdf_path = pdf_path
+
+    @property
+    def pdf_spilled(self):
+        return self._pdf_path is not None
+
+    def pdf_view(self):
+        """
+        Retourne le PDF sous forme de memoryview (sans copie s'il est en mémoire)
+        """
+        if self._pdf is not None:
+            return memoryview(self._pdf)
+        return memoryview(self.read_pdf())
+
+    def read_pdf(self):
+        """
+        Retourne les octets du PDF, relus depuis le disque s'il y a été écrit
+        """
+        if self._pdf is not None:
+            return self._pdf
+        if self._pdf_path is None:
+            raise ValueError("PDF déjà libéré")
+        with open(self._pdf_path, 'rb') as f:
+            return f.read()
+
+    def spill_pdf(self, directory=None):
+        """
+        Écrit le PDF dans un fichier temporaire et libère sa copie en mémoire
+        """
+        if self._pdf is None:
+            return self._pdf_path
+        fd, path = tempfile.mkstemp(suffix='.pdf', dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self._pdf)
+        self._pdf_path = path
+        self._pdf = None
+        return path
+
+    def release_text(self):
+        """
+        Libère le texte original
+        """
+        self.text = None
+
+    def structured(self):
+        """
+        Retourne l'export JSON structuré (voir create_structured_export)
+        """
+        return create_structured_export(self.anonymized, self.processing_date)
+
+    def memory_footprint(self):
+        """
+        Estime la mémoire occupée par le résultat, en octets
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self.anonymized) + sys.getsizeof(self.stats)
+        size += sum(sys.getsizeof(value) for value in self.stats.values())
+        if self.text is not None:
+            size += sys.getsizeof(self.text)
+        if self._pdf is not None:
+            size += sys.getsizeof(self._pdf)
+        if self.report is not None:
+            size += sys.getsizeof(self.report) + sys.getsizeof(self.report.timings)
+            size += sum(sys.getsizeof(warning) for warning in self.report.warnings)
+        return size
+
+    def close(self):
+        """
+        Libère le PDF et supprime son fichier temporaire éventuel
+        """
+        self._pdf = None
+        if self._pdf_path is not None:
+            try:
+                os.remove(self._pdf_path)
+            except OSError:
+                pass
+            self._pdf_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+# Fonction pour enchaîner extraction, anonymisation et rendu PDF
+def process_document(uploaded_file, file_type, custom_firstname="", custom_lastname="", progress=None,
+                     max_bytes=MAX_UPLOAD_BYTES, keep_text=True,
+                     soft_limit_bytes=SOFT_LIMIT_BYTES, soft_limit_seconds=SOFT_LIMIT_SECONDS):
+    """
+    Traite un document complet et retourne un DocumentResult (texte anonymisé, PDF,
+    statistiques, rapport de performances et, si keep_text, texte original)
+    Le callback progress(étape, courant, total) est appelé à chaque page extraite, après
+    chaque page (ou règle) anonymisée et tous les RENDER_PROGRESS_STEP éléments du PDF ;
+    une exception qu'il lève (annulation) interrompt le traitement à ce point
+    Au-delà de soft_limit_bytes, le PDF est écrit directement dans un fichier temporaire
+    (ses octets ne sont jamais copiés en mémoire ; reportlab garde toutefois le document
+    en construction en mémoire pendant le rendu, ce qui ne borne pas le pic) ;
+    les dépassements de soft_limit_bytes et soft_limit_seconds sont signalés dans le rapport
+    """
+    report = ProcessingReport(check_size(uploaded_file, max_bytes))
+    report.memory_start = current_memory()
+    peak_before = process_peak_memory()
+    
+    started = time.perf_counter()
+    layout = extract_layout(uploaded_file, file_type, progress, max_bytes)
+    report.timings[STAGE_EXTRACTION] = time.perf_counter() - started
+    report.pages = len(layout.page_starts)
+    report.characters = len(layout.text)
+    
+    if progress:
+        progress(STAGE_ANONYMISATION, 0, 1)
+    started = time.perf_counter()
+    try:
+        anonymized = anonymize_layout(layout, custom_firstname, custom_lastname, progress=progress)
+    finally:
+        if custom_firstname or custom_lastname:
+            # Ne pas garder les noms du candidat en mémoire après le traitement
+            forget_custom_names()
+    report.timings[STAGE_ANONYMISATION] = time.perf_counter() - started
+    processing_date = datetime.datetime.now().isoformat()
+    # Libérer le texte original dès la fin de l'anonymisation si keep_text=False
+    text = layout.text if keep_text else None
+    layout = None
+    if progress:
+        progress(STAGE_ANONYMISATION, 1, 1)
+        progress(STAGE_RENDU, 0, 1)
+    pdf_data = pdf_path = None
+    if soft_limit_bytes and report.size > soft_limit_bytes:
+        # Document volumineux : le PDF est écrit au fil du rendu dans un fichier temporaire
+        fd, pdf_path = tempfile.mkstemp(suffix='.pdf')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                create_pdf(anonymized, "", report.timings, output=f, progress=progress)
+        except BaseException:
+            os.remove(pdf_path)
+            raise
+        report.pdf_spilled = True
+        report.warnings.append(
+            f"Document volumineux : {report.size / (1024 * 1024):.1f} Mo "
+            f"(limite souple {soft_limit_bytes / (1024 * 1024):.1f} Mo), PDF écrit directement sur disque"
+        )
+    else:
+        pdf_data = create_pdf(anonymized, "", report.timings, progress=progress)
+    if progress:
+        progress(STAGE_RENDU, 1, 1)
+    
+    result = DocumentResult(anonymized.text, pdf_data, text, processing_date, report, pdf_path)
+    pdf_data = None
+    if soft_limit_seconds and report.total > soft_limit_seconds:
+        report.warnings.append(
+            f"Traitement lent : {report.total:.1f} s (limite souple {soft_limit_seconds:g} s), "
+            f"étape la plus longue : {report.slowest_stage()}"
+        )
+    report.memory_end = current_memory()
+    report.process_peak_memory = process_peak_memory()
+    report.peak_reached = (
+        peak_before is not None and report.process_peak_memory is not None
+        and report.process_peak_memory > peak_before
+    )
+    
+    return result
@@ -0,0 +1,251 @@
+# File de traitements asynchrones pour les anonymisations longues
+import queue
+import threading
+import time
+import uuid
+
+from anonymizer import process_document
+
+# Statuts possibles d'un traitement
+STATUS_EN_ATTENTE = "en_attente"
+STATUS_EN_COURS = "en_cours"
+STATUS_TERMINE = "termine"
+STATUS_ERREUR = "erreur"
+STATUS_ANNULE = "annule"
+
+FINAL_STATUSES = (STATUS_TERMINE, STATUS_ERREUR, STATUS_ANNULE)
+
+# Les traitements terminés sont retirés du registre après FINISHED_TTL secondes,
+# ou au-delà de MAX_FINISHED traitements terminés (les plus anciens d'abord)
+FINISHED_TTL = 15 * 60
+MAX_FINISHED = 32
+
+
+class JobCancelled(Exception):
+    """
+    Levée dans le traitement lorsque l'annulation a été demandée
+    """
+
+
+class JobQueueFull(Exception):
+    """
+    Levée à la soumission lorsque la file d'attente est pleine
+    """
+
+
+class Job:
+    """
+    Traitement soumis à la file : statut, étape en cours, résultat ou erreur
+    """
+
+    def __init__(self, func, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.status = STATUS_EN_ATTENTE
+        self.stage = None
+        self.current = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self._subscribers = []
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def done(self):
+        return self._done_event.is_set()
+
+    def cancel(self):
+        """
+        Demande l'annulation ; elle prend effet au prochain point de progression
+        """
+        self._cancel_event.set()
+
+    def wait(self, timeout=None):
+        """
+        Attend la fin du traitement, retourne False si le délai est dépassé
+        """
+        return self._done_event.wait(timeout)
+
+    def subscribe(self, callback):
+        """
+        Abonne callback(job) à chaque changement de progression ou de statut
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def snapshot(self):
+        """
+        Retourne l'état courant sous forme de dictionnaire
+        """
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "current": self.current,
+                "total": self.total,
+                "error": str(self.error) if self.error else None,
+            }
+
+    def _report(self, stage, current, total):
+        # Callback de progression transmis au traitement
+        if self.cancelled:
+            raise JobCancelled(self.id)
+        with self._lock:
+            self.stage = stage
+            self.current = current
+            self.total = total
+        self._notify()
+
+    def _set_status(self, status):
+        with self._lock:
+            self.status = status
+        self._notify()
+
+    def _notify(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(self)
+            except Exception:
+                # Un abonné défaillant ne doit pas interrompre le traitement
+                pass
+
+    def _run(self):
+        if self.cancelled:
+            self._finish(STATUS_ANNULE)
+            return
+        self._set_status(STATUS_EN_COURS)
+        try:
+            self.result = self._func(*self._args, progress=self._report, **self._kwargs)
+        except JobCancelled:
+            self._finish(STATUS_ANNULE)
+        except Exception as e:
+            self.error = e
+            self._finish(STATUS_ERREUR)
+        else:
+            self._finish(STATUS_TERMINE)
+
+    def _finish(self, status):
+        # Libérer les entrées (fichier en mémoire) dès la fin du traitement
+        self._args = ()
+        self._kwargs = {}
+        self.finished_at = time.monotonic()
+        self._set_status(status)
+        self._done_event.set()
+
+
+class JobManager:
+    """
+    Pool local de workers alimenté par une file d'attente bornée
+    Les traitements terminés expirent (voir FINISHED_TTL et MAX_FINISHED) : leur
+    résultat, qui contient le CV, n'est plus conservé par le registre
+    """
+
+    def __init__(self, max_workers=2, max_queue=8, finished_ttl=FINISHED_TTL, max_finished=MAX_FINISHED):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._finished_ttl = finished_ttl
+        self._max_finished = max_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker, name=f"anonymisation-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Soumet func(*args, progress=..., **kwargs) et retourne le Job créé
+        Lève JobQueueFull si la file d'attente est pleine
+        """
+        job = Job(func, args, kwargs)
+        with self._lock:
+            self._purge()
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise JobQueueFull(f"File d'attente pleine ({self._queue.maxsize} traitements)")
+        return job
+
+    def submit_document(self, uploaded_file, file_type, custom_firstname="", custom_lastname=""):
+        """
+        Soumet l'anonymisation complète d'un document (voir process_document)
+        """
+        return self.submit(process_document, uploaded_file, file_type, custom_firstname, custom_lastname)
+
+    def get(self, job_id):
+        """
+        Retourne le traitement, ou None s'il est inconnu ou expiré
+        """
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job:
+            job.cancel()
+        return job
+
+    def forget(self, job_id):
+        """
+        Retire un traitement du registre (en l'annulant s'il n'est pas terminé)
+        """
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job and not job.done:
+            job.cancel()
+        return job
+
+    def shutdown(self, wait=True):
+        """
+        Annule les traitements en attente et arrête les workers
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.status == STATUS_EN_ATTENTE:
+                job.cancel()
+        for _ in self._workers:
+            self._queue.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _purge(self):
+        # Appelé sous self._lock : retire les traitements terminés expirés
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished_at is not None),
+            key=lambda job: job.finished_at
+        )
+        excess = len(finished) - self._max_finished
+        now = time.monotonic()
+        for i, job in enumerate(finished):
+            if i < excess or now - job.finished_at > self._finished_ttl:
+                del self._jobs[job.id]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                job._run()
+                with self._lock:
+                    self._purge()
+            finally:
+                self._queue.task_done()
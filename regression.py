@@ -0,0 +1,409 @@
+# Harnais de non-régression : précision, rappel et débit des règles d'anonymisation
+#
+#   python regression.py [--repeat 20] [--update-baseline]
+#
+# Compare les moteurs optimisés (anonymize_cv, anonymize_cv_parallel, anonymize_layout,
+# anonymize_batch) à une copie figée de la version d'origine d'anonymize_cv
+# (reference_anonymize), sur le corpus annoté golden/corpus.json. Le code de sortie est 1 si :
+# - un moteur optimisé produit un texte différent du moteur de référence ;
+# - le rappel d'une catégorie de données personnelles baisse par rapport à
+#   golden/baseline.json (toute baisse signifie une fuite potentielle)
+#
+# Définitions, par catégorie :
+# - rappel : part des occurrences des valeurs annotées qui ont disparu du texte
+#   anonymisé (une occurrence restante est une fuite)
+# - précision : part des balises de la catégorie qui correspondent à une valeur
+#   masquée ; les balises en excès signalent un sur-masquage
+# Les valeurs "conserve" (non personnelles) doivent rester présentes : leur taux
+# de conservation est affiché mais ne fait pas échouer le harnais
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from anonymizer import PAGE_SEPARATOR, PARALLEL_CHUNK_SIZE, anonymize_batch, anonymize_cv, anonymize_cv_parallel, anonymize_layout, text_layout
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+CORPUS_PATH = os.path.join(GOLDEN_DIR, "corpus.json")
+BASELINE_PATH = os.path.join(GOLDEN_DIR, "baseline.json")
+
+# Balises produites pour chaque catégorie de données personnelles
+CATEGORY_TAGS = {
+    "nom": ("[NOM_MASQUÉ]", "[PRÉNOM_MASQUÉ]"),
+    "email": ("[EMAIL_MASQUÉ]",),
+    "telephone": ("[TÉLÉPHONE_MASQUÉ]",),
+    "adresse": ("[ADRESSE_MASQUÉE]", "[CODE_POSTAL_MASQUÉ]", "[VILLE_MASQUÉE]"),
+    "date_naissance": ("[DATE_NAISSANCE_MASQUÉE]", "[DATE_MASQUÉE]"),
+    "age": ("[ÂGE_MASQUÉ]",),
+    "nir": ("[NUMÉRO_SÉCU_MASQUÉ]",),
+    "permis": ("[PERMIS_MASQUÉ]",),
+}
+
+# Taille minimale du grand document : au-delà de deux segments, le moteur parallèle
+# répartit réellement le travail (en dessous, il se replie sur anonymize_cv)
+LARGE_DOCUMENT_SIZE = 2 * PARALLEL_CHUNK_SIZE + 1
+
+# Sauts de page qui ne forment pas un séparateur complet (début ou fin de texte,
+# sauts consécutifs, export pdftotext terminé par un saut de page) : le moteur par
+# pages doit les laisser en place
+PAGE_EDGE_CASES = [
+    "\f\nb",
+    "a\n\f",
+    "a\n\f\n\f\nb",
+    "a\n\f\n\n\f\nb",
+    "\f\nM. Jean DUPONT\n06 12 34 56 78\n\f\n12 rue de la Paix 75001 Paris\n\f",
+    "Né le 01/02/1990\n\f\n\f\n\f\njean.dupont@example.com\f",
+]
+
+
+# Moteur de référence : copie figée d'anonymize_cv tel qu'il était avant toute
+# optimisation (règles appliquées une à une avec re.sub). Ne pas la modifier : une
+# fusion ou une réécriture des expressions de get_rules doit se comparer à elle
+def reference_anonymize(text, custom_firstname="", custom_lastname=""):
+    """
+    Anonymise les données personnelles sensibles du CV selon le RGPD
+    Permet également de masquer manuellement un nom et prénom spécifique
+    """
+    anonymized = text
+    
+    # ÉTAPE 1 : Masquer le nom et prénom fournis manuellement (prioritaire)
+    if custom_firstname.strip():
+        # Masquer le prénom exact (insensible à la casse)
+        anonymized = re.sub(
+            rf'\b{re.escape(custom_firstname)}\b',
+            '[PRÉNOM_MASQUÉ]',
+            anonymized,
+            flags=re.IGNORECASE
+        )
+    
+    if custom_lastname.strip():
+        # Masquer le nom exact (insensible à la casse)
+        anonymized = re.sub(
+            rf'\b{re.escape(custom_lastname)}\b',
+            '[NOM_MASQUÉ]',
+            anonymized,
+            flags=re.IGNORECASE
+        )
+    
+    # ÉTAPE 2 : Masquer automatiquement les autres noms/prénoms potentiels (patterns RGPD)
+    # Masquer les noms et prénoms courants (patterns basiques)
+    # Recherche de "Prénom NOM" en début de ligne ou après certains mots-clés
+    anonymized = re.sub(
+        r'\b(M\.|Mme|Mlle|Monsieur|Madame|Mademoiselle)\s+([A-Z][a-zàâäéèêëïîôùûüç]+(\s+[A-Z][a-zàâäéèêëïîôùûüç]+)?)\s+([A-Z][A-ZÀÂÄÉÈÊËÏÎÔÙÛÜÇ\-]+)\b',
+        r'\1 [PRÉNOM_MASQUÉ] [NOM_MASQUÉ]',
+        anonymized
+    )
+    
+    # Masquer les noms en majuscules suivis de prénoms
+    anonymized = re.sub(
+        r'\b([A-Z][A-ZÀÂÄÉÈÊËÏÎÔÙÛÜÇ\-]{2,})\s+([A-Z][a-zàâäéèêëïîôùûüç]+)\b',
+        '[NOM_MASQUÉ] [PRÉNOM_MASQUÉ]',
+        anonymized
+    )
+    
+    # Masquer format "Prénom Nom" en début de document ou ligne
+    anonymized = re.sub(
+        r'^([A-Z][a-zàâäéèêëïîôùûüç]+)\s+([A-Z][a-zàâäéèêëïîôùûüç]+)',
+        '[PRÉNOM_MASQUÉ] [NOM_MASQUÉ]',
+        anonymized,
+        flags=re.MULTILINE
+    )
+    
+    # Masquer les emails
+    anonymized = re.sub(
+        r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', 
+        '[EMAIL_MASQUÉ]', 
+        anonymized
+    )
+    
+    # Masquer les numéros de téléphone français et internationaux
+    anonymized = re.sub(
+        r'(\+33|0033|0)[1-9](\s?\d{2}){4}', 
+        '[TÉLÉPHONE_MASQUÉ]', 
+        anonymized
+    )
+    anonymized = re.sub(
+        r'\b\d{2}[\s\.\-]?\d{2}[\s\.\-]?\d{2}[\s\.\-]?\d{2}[\s\.\-]?\d{2}\b', 
+        '[TÉLÉPHONE_MASQUÉ]', 
+        anonymized
+    )
+    
+    # Masquer les adresses complètes (pattern amélioré)
+    anonymized = re.sub(
+        r'\d{1,5}\s+(bis|ter)?\s*(rue|avenue|boulevard|allée|impasse|place|chemin|route|cours|quai)\s+[\w\s\'\-]+,?\s*\d{5}?\s*[\w\s\-]*',
+        '[ADRESSE_MASQUÉE]',
+        anonymized,
+        flags=re.IGNORECASE
+    )
+    
+    # Masquer les adresses sans numéro
+    anonymized = re.sub(
+        r'\b(rue|avenue|boulevard|allée|impasse|place|chemin|route|cours|quai)\s+[\w\s\'\-]{3,40}\s*,?\s*\d{5}',
+        '[ADRESSE_MASQUÉE]',
+        anonymized,
+        flags=re.IGNORECASE
+    )
+    
+    # Masquer les codes postaux français
+    anonymized = re.sub(r'\b\d{5}\b', '[CODE_POSTAL_MASQUÉ]', anonymized)
+    
+    # Masquer les villes après code postal
+    anonymized = re.sub(
+        r'\[CODE_POSTAL_MASQUÉ\]\s+[A-ZÀÂÄÉÈÊËÏÎÔÙÛÜÇ][a-zàâäéèêëïîôùûüç\s\-]+',
+        '[CODE_POSTAL_MASQUÉ] [VILLE_MASQUÉE]',
+        anonymized
+    )
+    
+    # Masquer les dates de naissance
+    anonymized = re.sub(
+        r'\b(né|née|naissance|birth)\s*(le|date)?\s*:?\s*\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4}\b', 
+        '[DATE_NAISSANCE_MASQUÉE]', 
+        anonymized, 
+        flags=re.IGNORECASE
+    )
+    
+    # Masquer les dates au format JJ/MM/AAAA
+    anonymized = re.sub(
+        r'\b\d{1,2}[\/\-\.]\d{1,2}[\/\-\.](19|20)\d{2}\b', 
+        '[DATE_MASQUÉE]', 
+        anonymized
+    )
+    
+    # Masquer l'âge
+    anonymized = re.sub(r'\b\d{2}\s*ans\b', '[ÂGE_MASQUÉ]', anonymized, flags=re.IGNORECASE)
+    
+    # Masquer les numéros de sécurité sociale
+    anonymized = re.sub(
+        r'\b[1-2]\s?\d{2}\s?\d{2}\s?\d{2}\s?\d{3}\s?\d{3}\s?\d{2}\b', 
+        '[NUMÉRO_SÉCU_MASQUÉ]', 
+        anonymized
+    )
+    
+    # Masquer permis de conduire
+    anonymized = re.sub(
+        r'\b(permis)\s*(de conduire)?\s*:?\s*[A-Z0-9]{10,}\b',
+        '[PERMIS_MASQUÉ]',
+        anonymized,
+        flags=re.IGNORECASE
+    )
+    
+    return anonymized
+
+
+def parallel_anonymize(text, custom_firstname="", custom_lastname=""):
+    # Segments courts pour exercer le découpage et la fusion même sur de petits textes
+    return anonymize_cv_parallel(
+        text, custom_firstname, custom_lastname,
+        workers=2, chunk_size=max(64, len(text) // 4)
+    )
+
+
+def layout_anonymize(text, custom_firstname="", custom_lastname=""):
+    # Texte d'une seule page : même résultat qu'anonymize_cv
+    return anonymize_layout(text_layout(text), custom_firstname, custom_lastname).text
+
+
+def pages_reference(text, custom_firstname="", custom_lastname=""):
+    # Référence page par page : une correspondance ne franchit jamais un séparateur
+    return PAGE_SEPARATOR.join(
+        reference_anonymize(page, custom_firstname, custom_lastname) for page in text.split(PAGE_SEPARATOR)
+    )
+
+
+# Moteurs comparés à la référence (exactitude)
+ENGINES = {
+    "optimise": anonymize_cv,
+    "parallele": parallel_anonymize,
+    "pages": layout_anonymize,
+}
+
+# Processus utilisés pour chronométrer le moteur parallèle (au moins deux, pour
+# qu'il ne se replie pas sur le traitement en série)
+TIMED_WORKERS = max(2, os.cpu_count() or 1)
+
+
+def timed_parallel_anonymize(text, custom_firstname="", custom_lastname=""):
+    return anonymize_cv_parallel(text, custom_firstname, custom_lastname, workers=TIMED_WORKERS)
+
+
+# Moteurs chronométrés, avec leurs paramètres par défaut
+TIMED_ENGINES = {
+    "optimise": anonymize_cv,
+    "parallele": timed_parallel_anonymize,
+}
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def large_text(corpus, size=LARGE_DOCUMENT_SIZE):
+    """
+    Concatène le corpus autant de fois que nécessaire pour atteindre size caractères
+    """
+    text = "\n\n".join(document["texte"] for document in corpus)
+    return "\n\n".join([text] * (size // (len(text) + 2) + 1))
+
+
+def _count(value, text):
+    # Occurrences de la valeur en tant que mot entier
+    return len(re.findall(rf'(?<!\w){re.escape(value)}(?!\w)', text))
+
+
+def evaluate(corpus, engine):
+    """
+    Retourne, par catégorie, le rappel et la précision de l'engine sur le corpus,
+    ainsi que le taux de conservation des valeurs non personnelles
+    """
+    totals = {category: {"occurrences": 0, "masquees": 0, "balises": 0, "vrais_positifs": 0}
+              for category in CATEGORY_TAGS}
+    kept = expected_kept = 0
+
+    for document in corpus:
+        text = document["texte"]
+        output = engine(text, document.get("prenom", ""), document.get("nom", ""))
+
+        masked_by_category = dict.fromkeys(CATEGORY_TAGS, 0)
+        seen = set()
+        for item in document["pii"]:
+            key = (item["categorie"], item["valeur"])
+            if key in seen:
+                continue
+            seen.add(key)
+            occurrences = _count(item["valeur"], text)
+            masked = occurrences - min(occurrences, _count(item["valeur"], output))
+            totals[item["categorie"]]["occurrences"] += occurrences
+            totals[item["categorie"]]["masquees"] += masked
+            masked_by_category[item["categorie"]] += masked
+
+        for category, tags in CATEGORY_TAGS.items():
+            tag_count = sum(output.count(tag) for tag in tags)
+            totals[category]["balises"] += tag_count
+            totals[category]["vrais_positifs"] += min(tag_count, masked_by_category[category])
+
+        expected_kept += len(document["conserve"])
+        kept += sum(1 for value in document["conserve"] if value in output)
+
+    scores = {}
+    for category, total in totals.items():
+        if not total["occurrences"] and not total["balises"]:
+            continue
+        scores[category] = {
+            "rappel": total["masquees"] / total["occurrences"] if total["occurrences"] else 1.0,
+            "precision": total["vrais_positifs"] / total["balises"] if total["balises"] else 1.0,
+            "occurrences": total["occurrences"],
+        }
+    conservation = kept / expected_kept if expected_kept else 1.0
+    return scores, conservation
+
+
+def compare_outputs(corpus, engine):
+    """
+    Retourne les identifiants des documents pour lesquels engine diffère de la référence
+    """
+    differences = []
+    for document in corpus:
+        args = (document["texte"], document.get("prenom", ""), document.get("nom", ""))
+        if engine(*args) != reference_anonymize(*args):
+            differences.append(document["id"])
+    return differences
+
+
+def throughput(texts, engine, repeat):
+    """
+    Retourne le débit de l'engine en caractères par seconde
+    """
+    characters = sum(len(text) for text in texts) * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            engine(text)
+    return characters / (time.perf_counter() - start)
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Non-régression des règles d'anonymisation")
+    parser.add_argument("--repeat", type=int, default=20, help="répétitions pour la mesure du débit (défaut : 20)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="enregistrer les rappels actuels comme nouvelle référence")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus()
+    baseline = load_baseline()
+    failures = []
+
+    # Exactitude : les moteurs optimisés doivent reproduire la référence, y compris
+    # sur un document assez long pour déclencher le parcours par zones et le
+    # découpage parallèle
+    large_document = {
+        "id": "corpus-concatene",
+        "texte": large_text(corpus),
+    }
+    for name, engine in ENGINES.items():
+        differences = compare_outputs(corpus + [large_document], engine)
+        if differences:
+            failures.append(f"moteur {name} différent de la référence : {', '.join(differences)}")
+    # Texte en pages : chaque document du corpus est une page, plus les sauts de page isolés
+    paged = PAGE_EDGE_CASES + [PAGE_SEPARATOR.join(document["texte"] for document in corpus)]
+    if any(layout_anonymize(text) != pages_reference(text) for text in paged):
+        failures.append("moteur pages différent de la référence page par page")
+    # Traitement par lots : chaque ligne du corpus est un texte du lot
+    lines = [line for document in corpus for line in document["texte"].split("\n")]
+    if anonymize_batch(lines) != [reference_anonymize(line) for line in lines]:
+        failures.append("moteur lot différent de la référence")
+
+    # Précision et rappel par catégorie
+    scores, conservation = evaluate(corpus, anonymize_cv)
+    print(f"{'Catégorie':<16}{'Rappel':>8}{'Réf.':>8}{'Précision':>11}{'Occ.':>6}")
+    for category, score in scores.items():
+        reference = baseline.get(category)
+        print(
+            f"{category:<16}{score['rappel']:>8.1%}"
+            f"{(format(reference, '.1%') if reference is not None else '-'):>8}"
+            f"{score['precision']:>11.1%}{score['occurrences']:>6}"
+        )
+        if reference is not None and score["rappel"] < reference:
+            failures.append(f"baisse du rappel ({category}) : {score['rappel']:.1%} < {reference:.1%}")
+    print(f"Conservation des valeurs non personnelles : {conservation:.1%}")
+
+    # Débit : petits documents puis un grand document
+    small = [document["texte"] for document in corpus]
+    large = [large_document["texte"]]
+    print(f"\nMoteur parallèle : {TIMED_WORKERS} processus, {os.cpu_count()} cœurs disponibles")
+    for label, texts, repeat in (("petits documents", small, args.repeat), ("grand document", large, 1)):
+        reference_speed = throughput(texts, reference_anonymize, repeat)
+        print(f"Débit ({label}) : référence {reference_speed / 1e6:.2f} M car./s")
+        for name, engine in TIMED_ENGINES.items():
+            speed = throughput(texts, engine, repeat)
+            delta = speed / reference_speed - 1
+            print(f"  {name:<10} {speed / 1e6:.2f} M car./s ({delta:+.1%})")
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({category: score["rappel"] for category, score in scores.items()},
+                      f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nRéférence mise à jour : {BASELINE_PATH}")
+
+    if failures:
+        print("\nÉCHEC :")
+        for failure in failures:
+            print(f"- {failure}")
+        return 1
+    print("\nOK : aucune baisse de rappel, moteurs identiques à la référence")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+# Surveillance d'un dossier de dépôt pour une anonymisation continue
+#
+#   python watcher.py dossier_depot dossier_sortie [--workers 2] [--interval 5]
+#
+# Seuls les fichiers nouveaux ou modifiés sont traités : un manifeste des
+# empreintes SHA-256 (.manifest.json dans le dossier de sortie) permet de
+# reprendre après un redémarrage sans refaire le travail déjà effectué
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from anonymizer import MIME_BY_EXTENSION, process_document
+from jobs import JobManager, STATUS_TERMINE
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog absent : surveillance par scrutation uniquement
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger("anonymisator.watcher")
+
+MANIFEST_NAME = ".manifest.json"
+# Délai sans modification avant de considérer un fichier déposé comme complet
+SETTLE_SECONDS = 2.0
+# Noms des exports écrits par anonymize_file : cv_pdf_anonymise.txt, .pdf, .json
+OUTPUT_SUFFIX = "_anonymise"
+OUTPUT_NAME = re.compile(
+    r'.*_(?:{})'.format('|'.join(re.escape(extension[1:]) for extension in MIME_BY_EXTENSION))
+    + re.escape(OUTPUT_SUFFIX) + r'\.(?:txt|pdf|json)',
+    re.IGNORECASE
+)
+
+
+def file_sha256(path):
+    """
+    Calcule l'empreinte SHA-256 d'un fichier en le lisant par blocs
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_atomic(path, data):
+    """
+    Écrit le fichier via un fichier temporaire du même dossier puis un renommage,
+    de sorte qu'un lecteur ne voie jamais de fichier partiel
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def anonymize_file(path, output_dir, progress=None):
+    """
+    Anonymise un fichier et écrit les exports texte, PDF et JSON dans output_dir
+    Retourne la liste des fichiers écrits
+    """
+    stem, extension = os.path.splitext(os.path.basename(path))
+    # L'extension fait partie du nom : cv.pdf et cv.docx ne s'écrasent pas
+    prefix = f"{stem}_{extension[1:].lower()}{OUTPUT_SUFFIX}"
+    with open(path, 'rb') as f:
+        result = process_document(f, MIME_BY_EXTENSION[extension.lower()], progress=progress, keep_text=False)
+
+    for warning in result.report.warnings:
+        logger.warning("%s : %s", os.path.basename(path), warning)
+    with result:
+        outputs = {
+            f"{prefix}.txt": result.anonymized.encode('utf-8'),
+            f"{prefix}.pdf": result.read_pdf(),
+            f"{prefix}.json": json.dumps(result.structured(), ensure_ascii=False, indent=2).encode('utf-8'),
+        }
+        for name, data in outputs.items():
+            write_atomic(os.path.join(output_dir, name), data)
+    return sorted(outputs)
+
+
+class _WakeUpHandler(FileSystemEventHandler):
+    # Réveille la boucle principale à chaque événement du dossier
+    def __init__(self, wake_up):
+        self._wake_up = wake_up
+
+    def on_any_event(self, event):
+        self._wake_up.set()
+
+
+class FolderWatcher:
+    """
+    Surveille input_dir et anonymise les fichiers nouveaux ou modifiés vers output_dir
+    Les événements inotify (via watchdog) réveillent la boucle ; un parcours complet
+    du dossier toutes les interval secondes sert de filet de sécurité, et de seul
+    mécanisme si watchdog est absent ou use_events=False
+    Lève ValueError si input_dir et output_dir désignent le même dossier
+    """
+
+    def __init__(self, input_dir, output_dir, workers=2, interval=5.0, use_events=True):
+        if os.path.realpath(input_dir) == os.path.realpath(output_dir):
+            # Les exports seraient eux-mêmes anonymisés, indéfiniment
+            raise ValueError("Le dossier de sortie doit être distinct du dossier de dépôt")
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_in_flight = workers
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+        self._manager = JobManager(max_workers=workers, max_queue=workers)
+        self._in_flight = {}
+        self._settling = False
+        self._wake_up = threading.Event()
+        self._stop = threading.Event()
+        self._observer = None
+        if use_events and Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_WakeUpHandler(self._wake_up), input_dir, recursive=False)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_manifest(self):
+        data = json.dumps(self.manifest, ensure_ascii=False, indent=2, sort_keys=True)
+        write_atomic(self.manifest_path, data.encode('utf-8'))
+
+    def _candidates(self):
+        # Fichiers pris en charge, complets, et nouveaux ou modifiés depuis le manifeste
+        now = time.time()
+        self._settling = False
+        with os.scandir(self.input_dir) as entries:
+            for entry in entries:
+                name = entry.name
+                if not entry.is_file() or name.startswith('.') or name in self._in_flight:
+                    continue
+                if os.path.splitext(name)[1].lower() not in MIME_BY_EXTENSION:
+                    continue
+                if OUTPUT_NAME.fullmatch(name):
+                    # Export d'un traitement précédent (dossier de sortie déposé par erreur)
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Fichier supprimé depuis le parcours du dossier
+                    continue
+                if now - stat.st_mtime < SETTLE_SECONDS:
+                    # Fichier en cours d'écriture : le reprendre au prochain passage
+                    self._settling = True
+                    continue
+                known = self.manifest.get(name)
+                if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+                    continue
+                yield name, stat
+
+    def scan(self):
+        """
+        Soumet les fichiers à traiter, dans la limite des traitements simultanés
+        """
+        changed = False
+        for name, stat in self._candidates():
+            if len(self._in_flight) >= self.max_in_flight:
+                break
+            path = os.path.join(self.input_dir, name)
+            try:
+                sha256 = file_sha256(path)
+            except OSError as e:
+                # Fichier supprimé ou illisible depuis le parcours : réessayer au prochain passage
+                logger.warning("Lecture impossible de %s : %s", name, e)
+                continue
+            known = self.manifest.get(name)
+            if known and known['sha256'] == sha256:
+                # Contenu inchangé (simple copie ou touch) : ne pas retraiter
+                known['size'], known['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+                changed = True
+                continue
+            job = self._manager.submit(anonymize_file, path, self.output_dir)
+            self._in_flight[name] = (job, sha256, stat)
+            logger.info("Traitement de %s", name)
+        if changed:
+            self._save_manifest()
+
+    def reap(self, timeout=0):
+        """
+        Enregistre dans le manifeste les traitements terminés
+        Attend au plus timeout secondes (None : jusqu'à la fin de tous les traitements)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        finished = []
+        for name, (job, sha256, stat) in self._in_flight.items():
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            if job.wait(remaining):
+                finished.append(name)
+        for name in finished:
+            job, sha256, stat = self._in_flight.pop(name)
+            self._manager.forget(job.id)
+            entry = {
+                "sha256": sha256,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "status": job.status,
+            }
+            if job.status == STATUS_TERMINE:
+                entry["outputs"] = job.result
+                logger.info("%s anonymisé", name)
+            else:
+                # L'erreur est conservée : le fichier ne sera retraité que s'il change
+                entry["error"] = str(job.error)
+                logger.error("Échec du traitement de %s : %s", name, job.error)
+            self.manifest[name] = entry
+        if finished:
+            self._save_manifest()
+        return finished
+
+    def run_once(self):
+        """
+        Traite tous les fichiers en attente puis rend la main
+        """
+        while True:
+            self.scan()
+            if not self._in_flight:
+                return
+            self.reap(timeout=self.interval)
+
+    def run(self):
+        """
+        Boucle de surveillance, jusqu'à l'appel de stop()
+        """
+        if self._observer:
+            self._observer.start()
+        logger.info(
+            "Surveillance de %s (%s)", self.input_dir,
+            "événements du système de fichiers" if self._observer else "scrutation"
+        )
+        try:
+            while not self._stop.is_set():
+                self._wake_up.clear()
+                self.scan()
+                self.reap()
+                # Attendre un événement, la fin d'un traitement, un fichier en cours
+                # d'écriture ou l'intervalle de scrutation
+                busy = self._in_flight or self._settling
+                wait = min(self.interval, SETTLE_SECONDS) if busy else self.interval
+                self._wake_up.wait(wait)
+        finally:
+            self.close()
+
+    def stop(self):
+        self._stop.set()
+        self._wake_up.set()
+
+    def close(self):
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if self._manager:
+            self.reap(timeout=None)
+            self._manager.shutdown()
+            self._manager = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Anonymisation continue d'un dossier de CV")
+    parser.add_argument("input_dir", help="dossier de dépôt surveillé")
+    parser.add_argument("output_dir", help="dossier des fichiers anonymisés")
+    parser.add_argument("--workers", type=int, default=2, help="traitements simultanés (défaut : 2)")
+    parser.add_argument("--interval", type=float, default=5.0, help="intervalle de scrutation en secondes (défaut : 5)")
+    parser.add_argument("--polling", action="store_true", help="ne pas utiliser les événements inotify")
+    parser.add_argument("--once", action="store_true", help="traiter les fichiers en attente puis quitter")
+    args = parser.parse_args(argv)
+    if os.path.realpath(args.input_dir) == os.path.realpath(args.output_dir):
+        parser.error("le dossier de sortie doit être distinct du dossier de dépôt")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    os.makedirs(args.output_dir, exist_ok=True)
+    watcher = FolderWatcher(
+        args.input_dir,
+        args.output_dir,
+        workers=args.workers,
+        interval=args.interval,
+        use_events=not (args.polling or args.once)
+    )
+    if args.once:
+        try:
+            watcher.run_once()
+        finally:
+            watcher.close()
+        return
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Arrêt demandé")
+
+
+if __name__ == "__main__":
+    main()